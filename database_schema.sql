@@ -5,23 +5,30 @@ CREATE DATABASE IF NOT EXISTS network_discovery;
 
 USE network_discovery;
 
+-- Tabla particionada por día según scan_timestamp; el script crea la partición
+-- ping_results_AAAAMMDD de cada día antes de guardar un escaneo
 CREATE TABLE IF NOT EXISTS ping_results (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     ip_address INET NOT NULL,
     packets_sent INTEGER NOT NULL DEFAULT 1,
     packets_received INTEGER NOT NULL DEFAULT 0,
-    packet_loss_percentage DECIMAL(5,2) NOT NULL DEFAULT 0.00,
-    latency_ms DECIMAL(10,3) NULL,
+    loss_pct SMALLINT NOT NULL DEFAULT 0,          -- pérdida de paquetes en %
+    latency_dms SMALLINT NULL,                     -- latencia en décimas de ms
     is_active BOOLEAN NOT NULL DEFAULT FALSE,
     scan_timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-    response_time DECIMAL(10,3) NULL,
     ttl INTEGER NULL,
+    PRIMARY KEY (id, scan_timestamp),
     CONSTRAINT unique_ip_scan UNIQUE(ip_address, scan_timestamp)
-);
+) PARTITION BY RANGE (scan_timestamp);
+
+-- Partición para filas fuera de las particiones diarias
+CREATE TABLE IF NOT EXISTS ping_results_default PARTITION OF ping_results DEFAULT;
 
 -- Índices para optimizar consultas
 CREATE INDEX IF NOT EXISTS idx_ip_address ON ping_results(ip_address);
-CREATE INDEX IF NOT EXISTS idx_scan_timestamp ON ping_results(scan_timestamp);
+-- BRIN: índice mínimo y barato de mantener para inserciones en orden temporal
+CREATE INDEX IF NOT EXISTS idx_scan_timestamp_brin ON ping_results
+    USING BRIN (scan_timestamp) WITH (pages_per_range = 32);
 CREATE INDEX IF NOT EXISTS idx_is_active ON ping_results(is_active);
 
 -- Vista para obtener el último escaneo de cada IP
@@ -30,11 +37,10 @@ SELECT DISTINCT ON (ip_address)
     ip_address,
     packets_sent,
     packets_received,
-    packet_loss_percentage,
-    latency_ms,
+    loss_pct,
+    latency_dms,
     is_active,
     scan_timestamp,
-    response_time,
     ttl
 FROM ping_results
 ORDER BY ip_address, scan_timestamp DESC;
\ No newline at end of file
@@ -6,31 +6,132 @@ Autor: Sistema de Descubrimiento de Red
 Fecha: 2025-10-04
 """
 
-import subprocess
+import asyncio
+import csv
+import io
 import ipaddress
 import time
 import re
+import socket
+import struct
 import psycopg2
-from psycopg2.extras import RealDictCursor
 import logging
-from datetime import datetime
+import logging.handlers
+from datetime import datetime, timedelta
 import json
 import sys
 import os
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import threading
 
 # Configuración de logging
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+LOG_BUFFER_CAPACITY = 200
+
+# El archivo de log se escribe por bloques: MemoryHandler acumula hasta
+# LOG_BUFFER_CAPACITY registros (o un ERROR) antes de volcarlos al FileHandler
+_file_handler = logging.FileHandler('network_discovery.log')
+_file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
+    format=LOG_FORMAT,
     handlers=[
-        logging.FileHandler('network_discovery.log'),
+        logging.handlers.MemoryHandler(LOG_BUFFER_CAPACITY, target=_file_handler),
         logging.StreamHandler(sys.stdout)
     ]
 )
 logger = logging.getLogger(__name__)
 
+# Constantes ICMP
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+ICMP_PAYLOAD = b'NetworkDiscovery'.ljust(56, b'\x00')
+
+# Echo Request enviados seguidos antes de ceder el bucle al lector de respuestas
+ICMP_SEND_BATCH = 64
+# Buffer de recepción del socket ICMP (el kernel lo limita a net.core.rmem_max);
+# evita perder respuestas que llegan entre dos lecturas en escaneos /16 o mayores
+ICMP_RECV_BUFFER = 4 * 1024 * 1024
+
+# Segundos mínimos entre mensajes de progreso del escaneo
+PROGRESS_LOG_INTERVAL = 1.0
+
+# Versión del esquema de ping_results; un archivo centinela en SCHEMA_CACHE_DIR
+# indica que ya fue creado y permite omitir el DDL en las siguientes ejecuciones
+SCHEMA_VERSION = 4
+SCHEMA_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'network_discovery')
+
+# Valor máximo de las columnas SMALLINT (latencia en décimas de ms: 3276.7 ms)
+SMALLINT_MAX = 32767
+
+# Columnas devueltas por la consulta de get_scan_summary, en orden
+SUMMARY_COLUMNS = (
+    'total_scanned', 'active_hosts', 'inactive_hosts',
+    'avg_latency', 'min_latency', 'max_latency', 'last_scan'
+)
+
+# Argumentos y expresiones regulares del modo comando ping, elegidos una sola
+# vez al importar según el sistema operativo. Los patrones son bytes para
+# analizar la salida del proceso sin decodificarla
+_RE_TIME_NT = re.compile(rb'tiempo[<=\s]*(\d+)ms', re.IGNORECASE)
+_RE_TTL_NT = re.compile(rb'TTL=(\d+)')
+_RE_TIME_UNIX = re.compile(rb'time=(\d+\.?\d*)ms')
+_RE_TTL_UNIX = re.compile(rb'ttl=(\d+)')
+
+if os.name == 'nt':
+    _PING_ARGS = ('ping', '-n', '1', '-w', '3000')
+    _RE_TIME, _RE_TTL = _RE_TIME_NT, _RE_TTL_NT
+else:
+    _PING_ARGS = ('ping', '-c', '1', '-W', '3')
+    _RE_TIME, _RE_TTL = _RE_TIME_UNIX, _RE_TTL_UNIX
+
+# IP_RECVTTL permite leer el TTL en sockets SOCK_DGRAM (no incluyen cabecera IP)
+_IP_RECVTTL = getattr(socket, 'IP_RECVTTL', 12 if sys.platform.startswith('linux') else None)
+
+
+def _word_sum(data):
+    """
+    Suma las palabras de 16 bits (big-endian) de un bloque, rellenando con un
+    byte cero si su longitud es impar
+
+    Args:
+        data (bytes): Bloque a sumar
+
+    Returns:
+        int: Suma sin plegar de las palabras
+    """
+    if len(data) % 2:
+        data += b'\x00'
+    # Un único unpack en C de todas las palabras de 16 bits en lugar de un bucle por byte
+    return sum(struct.unpack(f'!{len(data) // 2}H', data))
+
+
+def _fold_checksum(total):
+    """Pliega una suma de palabras al checksum de Internet (RFC 1071) de 16 bits"""
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+
+def _int_to_ip(ip_int):
+    """Convierte una dirección IPv4 entera a texto sin crear objetos IPv4Address"""
+    return f"{(ip_int >> 24) & 0xff}.{(ip_int >> 16) & 0xff}.{(ip_int >> 8) & 0xff}.{ip_int & 0xff}"
+
+
+# Cabecera ICMP (tipo, código, checksum, identificador, secuencia) y suma de
+# palabras del payload, que es igual en todos los paquetes y se calcula una vez
+_ICMP_HEADER = struct.Struct('!BBHHH')
+_PAYLOAD_WORD_SUM = _word_sum(ICMP_PAYLOAD)
+
+
+def _build_echo_request(ident, seq):
+    """
+    Construye un paquete ICMP Echo Request. El checksum es incremental: solo se
+    suman las palabras de la cabecera a la suma precalculada del payload
+    """
+    checksum = _fold_checksum(_PAYLOAD_WORD_SUM + (ICMP_ECHO_REQUEST << 8) + ident + seq)
+    return _ICMP_HEADER.pack(ICMP_ECHO_REQUEST, 0, checksum, ident, seq) + ICMP_PAYLOAD
+
+
 class NetworkDiscovery:
     def __init__(self, db_config):
         """
@@ -41,13 +142,15 @@ class NetworkDiscovery:
         """
         self.db_config = db_config
         self.connection = None
-        self.lock = threading.Lock()
+        self.cursor = None
         
     def connect_database(self):
         """Establece conexión con la base de datos PostgreSQL"""
         try:
             self.connection = psycopg2.connect(**self.db_config)
             self.connection.autocommit = True
+            # Un único cursor para toda la ejecución
+            self.cursor = self.connection.cursor()
             logger.info("Conexión a base de datos establecida exitosamente")
             return True
         except Exception as e:
@@ -55,191 +158,507 @@ class NetworkDiscovery:
             return False
     
     def create_table_if_not_exists(self):
-        """Crea la tabla ping_results si no existe"""
+        """
+        Crea la tabla ping_results si no existe, particionada por día según
+        scan_timestamp, con una partición DEFAULT para filas fuera de rango
+        """
         try:
-            cursor = self.connection.cursor()
             create_table_sql = """
             CREATE TABLE IF NOT EXISTS ping_results (
-                id SERIAL PRIMARY KEY,
+                id SERIAL,
                 ip_address INET NOT NULL,
                 packets_sent INTEGER NOT NULL DEFAULT 1,
                 packets_received INTEGER NOT NULL DEFAULT 0,
-                packet_loss_percentage DECIMAL(5,2) NOT NULL DEFAULT 0.00,
-                latency_ms DECIMAL(10,3) NULL,
+                loss_pct SMALLINT NOT NULL DEFAULT 0,
+                latency_dms SMALLINT NULL,
                 is_active BOOLEAN NOT NULL DEFAULT FALSE,
                 scan_timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                response_time DECIMAL(10,3) NULL,
-                ttl INTEGER NULL
-            );
-            
+                ttl INTEGER NULL,
+                PRIMARY KEY (id, scan_timestamp)
+            ) PARTITION BY RANGE (scan_timestamp);
+
+            -- Convierte tablas anteriores (packet_loss_percentage / latency_ms en DECIMAL)
+            -- a SMALLINT; la vista depende de esas columnas y se recrea al final
+            DO $$
+            BEGIN
+                IF EXISTS (
+                    SELECT 1 FROM information_schema.columns
+                    WHERE table_name = 'ping_results' AND column_name = 'latency_ms'
+                ) THEN
+                    DROP VIEW IF EXISTS latest_ping_results;
+                    ALTER TABLE ping_results
+                        ADD COLUMN IF NOT EXISTS loss_pct SMALLINT NOT NULL DEFAULT 0,
+                        ADD COLUMN IF NOT EXISTS latency_dms SMALLINT NULL;
+                    UPDATE ping_results SET
+                        loss_pct = round(packet_loss_percentage),
+                        latency_dms = CASE WHEN latency_ms > 3276.7 THEN 32767
+                                           ELSE round(latency_ms * 10) END;
+                    ALTER TABLE ping_results
+                        DROP COLUMN packet_loss_percentage,
+                        DROP COLUMN latency_ms,
+                        DROP COLUMN IF EXISTS response_time;
+                END IF;
+            END $$;
+
             CREATE INDEX IF NOT EXISTS idx_ip_address ON ping_results(ip_address);
-            CREATE INDEX IF NOT EXISTS idx_scan_timestamp ON ping_results(scan_timestamp);
             CREATE INDEX IF NOT EXISTS idx_is_active ON ping_results(is_active);
+
+            -- Solo si la tabla es particionada (una tabla anterior sin particionar se usa tal cual)
+            DO $$
+            BEGIN
+                IF (SELECT relkind FROM pg_class WHERE oid = 'ping_results'::regclass) = 'p' THEN
+                    CREATE TABLE IF NOT EXISTS ping_results_default
+                        PARTITION OF ping_results DEFAULT;
+                    CREATE INDEX IF NOT EXISTS idx_scan_timestamp_brin ON ping_results
+                        USING BRIN (scan_timestamp) WITH (pages_per_range = 32);
+                END IF;
+            END $$;
+
+            CREATE OR REPLACE VIEW latest_ping_results AS
+            SELECT DISTINCT ON (ip_address)
+                ip_address, packets_sent, packets_received, loss_pct,
+                latency_dms, is_active, scan_timestamp, ttl
+            FROM ping_results
+            ORDER BY ip_address, scan_timestamp DESC;
             """
-            cursor.execute(create_table_sql)
-            cursor.close()
+            self.cursor.execute(create_table_sql)
             logger.info("Tabla ping_results verificada/creada")
             return True
         except Exception as e:
             logger.error(f"Error creando tabla: {e}")
             return False
     
-    def ping_host(self, ip_address):
+    def create_daily_partition(self, day):
         """
-        Ejecuta ping a una dirección IP específica y extrae estadísticas
-        
+        Crea, si no existe, la partición diaria de ping_results que contiene la fecha dada
+
         Args:
-            ip_address (str): Dirección IP a hacer ping
-            
+            day (datetime): Fecha del escaneo
+
         Returns:
-            dict: Resultado del ping con estadísticas
+            bool: True si la partición está disponible
         """
-        result = {
+        start = day.date()
+        end = start + timedelta(days=1)
+        partition = f"ping_results_{start:%Y%m%d}"
+        try:
+            self.cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {partition} PARTITION OF ping_results "
+                "FOR VALUES FROM (%s) TO (%s)",
+                (start.isoformat(), end.isoformat())
+            )
+            return True
+        except Exception as e:
+            logger.warning(f"No se pudo crear la partición {partition}: {e}")
+            return False
+
+    def _schema_sentinel_path(self):
+        """Ruta del archivo centinela del esquema para la base de datos configurada"""
+        db_id = '_'.join(
+            str(self.db_config.get(key, '')) for key in ('host', 'port', 'database')
+        )
+        db_id = re.sub(r'[^\w.-]', '_', db_id)
+        return os.path.join(SCHEMA_CACHE_DIR, f"schema_v{SCHEMA_VERSION}_{db_id}")
+
+    def ensure_schema(self):
+        """
+        Verifica/crea la tabla ping_results solo si no hay centinela de la
+        versión actual del esquema, evitando el DDL en cada ejecución
+
+        Returns:
+            bool: True si el esquema está disponible
+        """
+        sentinel = self._schema_sentinel_path()
+        if os.path.exists(sentinel):
+            logger.info(f"Esquema v{SCHEMA_VERSION} ya verificado (centinela: {sentinel})")
+            return True
+
+        if not self.create_table_if_not_exists():
+            return False
+
+        try:
+            os.makedirs(SCHEMA_CACHE_DIR, exist_ok=True)
+            with open(sentinel, 'a'):
+                pass
+        except OSError as e:
+            logger.warning(f"No se pudo crear el centinela del esquema: {e}")
+        return True
+
+    def _new_result(self, ip_address):
+        """Crea el diccionario de resultado de un host, inicialmente inactivo"""
+        return {
             'ip_address': ip_address,
             'packets_sent': 1,
             'packets_received': 0,
             'packet_loss_percentage': 100.0,
             'latency_ms': None,
             'is_active': False,
-            'response_time': None,
-            'ttl': None,
-            'scan_timestamp': datetime.now()
+            'ttl': None
         }
-        
+
+    def _open_icmp_socket(self):
+        """
+        Abre un socket ICMP. Primero intenta SOCK_DGRAM (sin privilegios en Linux
+        si net.ipv4.ping_group_range lo permite) y luego SOCK_RAW (CAP_NET_RAW)
+
+        Returns:
+            socket.socket: Socket ICMP abierto, o None si no hay permisos
+        """
+        # El bucle de eventos de Windows (Proactor) no soporta add_reader
+        if os.name == 'nt':
+            return None
+
+        for sock_type in (socket.SOCK_DGRAM, socket.SOCK_RAW):
+            try:
+                sock = socket.socket(socket.AF_INET, sock_type, socket.IPPROTO_ICMP)
+            except OSError:
+                continue
+
+            sock.setblocking(False)
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, ICMP_RECV_BUFFER)
+            except OSError:
+                pass
+
+            if sock_type == socket.SOCK_DGRAM and _IP_RECVTTL is not None:
+                try:
+                    sock.setsockopt(socket.IPPROTO_IP, _IP_RECVTTL, 1)
+                except OSError:
+                    pass
+            return sock
+        return None
+
+    async def _raw_ping_batch(self, sock, host_range, timeout=3.0):
+        """
+        Envía un ICMP Echo Request a cada IP por un único socket no bloqueante y
+        recoge las respuestas desde el bucle asyncio (loop.add_reader), sin
+        threads, procesos ni parseo de texto
+
+        Args:
+            sock (socket.socket): Socket ICMP abierto con _open_icmp_socket
+            host_range (range): Direcciones IP (como enteros) a hacer ping
+            timeout (float): Segundos de espera por respuestas tras el envío
+
+        Returns:
+            list: Resultados del ping, uno por IP y en el mismo orden
+        """
+        loop = asyncio.get_running_loop()
+        results = {}
+        is_raw = sock.type == socket.SOCK_RAW
+        use_recvmsg = not is_raw and hasattr(sock, 'recvmsg')
+        ident = os.getpid() & 0xffff
+        pending = {}
+        total = outstanding = len(host_range)
+        sent = active = 0
+        all_done = loop.create_future()
+        last_progress_log = time.monotonic()
+
+        def _log_progress():
+            # Mostrar progreso como máximo una vez por intervalo
+            nonlocal last_progress_log
+            now = time.monotonic()
+            if now - last_progress_log >= PROGRESS_LOG_INTERVAL:
+                last_progress_log = now
+                logger.info(
+                    "Progreso: %.1f%% (%d/%d enviados) - Activos: %d",
+                    sent / total * 100, sent, total, active
+                )
+
+        def _on_reply():
+            nonlocal outstanding, active
+            # Vaciar todas las respuestas disponibles en el socket
+            while True:
+                ttl = None
+                try:
+                    if use_recvmsg:
+                        data, ancdata, _, addr = sock.recvmsg(1500, socket.CMSG_SPACE(4))
+                        for level, cmsg_type, cmsg_data in ancdata:
+                            if level == socket.IPPROTO_IP and cmsg_type in (socket.IP_TTL, _IP_RECVTTL):
+                                ttl = int.from_bytes(cmsg_data[:4], sys.byteorder)
+                    else:
+                        data, addr = sock.recvfrom(1500)
+                except OSError:
+                    break
+                received_at = time.perf_counter()
+
+                # SOCK_RAW (y SOCK_DGRAM en macOS) entrega la cabecera IP delante del ICMP
+                if data and data[0] >> 4 == 4:
+                    ttl = data[8]
+                    data = data[(data[0] & 0x0f) * 4:]
+                if len(data) < 8:
+                    continue
+
+                icmp_type, _, _, reply_ident, reply_seq = _ICMP_HEADER.unpack_from(data)
+                ip = addr[0]
+                if icmp_type != ICMP_ECHO_REPLY or ip not in pending:
+                    continue
+                # En SOCK_DGRAM el kernel reescribe el identificador y filtra por nosotros
+                if (is_raw and reply_ident != ident) or reply_seq != pending[ip][0]:
+                    continue
+
+                latency = round((received_at - pending.pop(ip)[1]) * 1000, 3)
+                results[ip].update(
+                    is_active=True, packets_received=1, packet_loss_percentage=0.0,
+                    latency_ms=latency, ttl=ttl
+                )
+                outstanding -= 1
+                active += 1
+                logger.info("✓ %s - ACTIVO (latencia: %sms)", ip, latency)
+
+            _log_progress()
+            if outstanding == 0 and not all_done.done():
+                all_done.set_result(None)
+
+        loop.add_reader(sock.fileno(), _on_reply)
+        try:
+            # Enviar todos los Echo Request, cediendo el bucle para ir leyendo respuestas
+            for seq, ip_int in enumerate(host_range):
+                seq &= 0xffff
+                ip = _int_to_ip(ip_int)
+                results[ip] = self._new_result(ip)
+                packet = _build_echo_request(ident, seq)
+                pending[ip] = (seq, time.perf_counter())
+                while True:
+                    try:
+                        sock.sendto(packet, (ip, 0))
+                        break
+                    except BlockingIOError:
+                        await asyncio.sleep(0.001)
+                    except OSError as e:
+                        del pending[ip]
+                        outstanding -= 1
+                        logger.error("✗ %s - ERROR: %s", ip, e)
+                        break
+                sent += 1
+                if seq % ICMP_SEND_BATCH == ICMP_SEND_BATCH - 1:
+                    _log_progress()
+                    await asyncio.sleep(0)
+
+            # Esperar respuestas hasta que respondan todos o venza el timeout
+            if outstanding:
+                try:
+                    await asyncio.wait_for(all_done, timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            loop.remove_reader(sock.fileno())
+
+        for ip in pending:
+            logger.info("✗ %s - INACTIVO", ip)
+
+        return list(results.values())
+
+    async def ping_host(self, ip_address, semaphore):
+        """
+        Ejecuta ping a una dirección IP específica y extrae estadísticas.
+        Se usa solo cuando no es posible abrir un socket ICMP
+
+        Args:
+            ip_address (str): Dirección IP a hacer ping
+            semaphore (asyncio.Semaphore): Limita los procesos ping simultáneos
+
+        Returns:
+            dict: Resultado del ping con estadísticas
+        """
+        result = self._new_result(ip_address)
+
         try:
-            # Comando ping para Windows
-            if os.name == 'nt':
-                cmd = ['ping', '-n', '1', '-w', '3000', ip_address]
-            else:
-                # Comando ping para Linux/Unix
-                cmd = ['ping', '-c', '1', '-W', '3', ip_address]
-            
             # Ejecutar ping
-            process = subprocess.run(
-                cmd, 
-                capture_output=True, 
-                text=True, 
-                timeout=10
-            )
-            
+            async with semaphore:
+                process = await asyncio.create_subprocess_exec(
+                    *_PING_ARGS, ip_address,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.DEVNULL
+                )
+                try:
+                    stdout, _ = await asyncio.wait_for(process.communicate(), timeout=10)
+                except asyncio.TimeoutError:
+                    process.kill()
+                    await process.wait()
+                    raise
+
             if process.returncode == 0:
-                result['is_active'] = True
-                result['packets_received'] = 1
-                result['packet_loss_percentage'] = 0.0
-                
-                # Extraer latencia del output
-                output = process.stdout
-                
-                if os.name == 'nt':
-                    # Parsing para Windows
-                    time_match = re.search(r'tiempo[<=\s]*(\d+)ms', output, re.IGNORECASE)
-                    ttl_match = re.search(r'TTL=(\d+)', output)
-                else:
-                    # Parsing para Linux/Unix
-                    time_match = re.search(r'time=(\d+\.?\d*)ms', output)
-                    ttl_match = re.search(r'ttl=(\d+)', output)
-                
-                if time_match:
-                    latency = float(time_match.group(1))
-                    result['latency_ms'] = latency
-                    result['response_time'] = latency
-                
-                if ttl_match:
-                    result['ttl'] = int(ttl_match.group(1))
-                
-                logger.info(f"✓ {ip_address} - ACTIVO (latencia: {result['latency_ms']}ms)")
+                # Extraer latencia y TTL del output
+                time_match = _RE_TIME.search(stdout)
+                ttl_match = _RE_TTL.search(stdout)
+                latency = float(time_match.group(1)) if time_match else None
+                ttl = int(ttl_match.group(1)) if ttl_match else None
+
+                result.update(
+                    is_active=True, packets_received=1, packet_loss_percentage=0.0,
+                    latency_ms=latency, ttl=ttl
+                )
+                logger.info("✓ %s - ACTIVO (latencia: %sms)", ip_address, latency)
             else:
-                logger.info(f"✗ {ip_address} - INACTIVO")
-                
-        except subprocess.TimeoutExpired:
-            logger.warning(f"⚠ {ip_address} - TIMEOUT")
+                logger.info("✗ %s - INACTIVO", ip_address)
+
+        except asyncio.TimeoutError:
+            logger.warning("⚠ %s - TIMEOUT", ip_address)
         except Exception as e:
-            logger.error(f"✗ {ip_address} - ERROR: {e}")
-            
+            logger.error("✗ %s - ERROR: %s", ip_address, e)
+
         return result
-    
-    def save_ping_result(self, ping_result):
+
+    def save_ping_results(self, scan_rows):
         """
-        Guarda el resultado del ping en la base de datos
-        
+        Guarda los resultados del escaneo en la base de datos con un único
+        COPY FROM STDIN, enviando las filas como CSV en memoria
+
         Args:
-            ping_result (dict): Resultado del ping a guardar
+            scan_rows (list): Tuplas con los valores de cada resultado de ping
         """
+        if not scan_rows:
+            return
+
         try:
-            with self.lock:
-                cursor = self.connection.cursor()
-                
-                insert_sql = """
-                INSERT INTO ping_results (
-                    ip_address, packets_sent, packets_received, 
-                    packet_loss_percentage, latency_ms, is_active,
-                    scan_timestamp, response_time, ttl
-                ) VALUES (
-                    %s, %s, %s, %s, %s, %s, %s, %s, %s
-                )
-                """
-                
-                cursor.execute(insert_sql, (
+            buffer = io.StringIO()
+            csv.writer(buffer, lineterminator='\n').writerows(scan_rows)
+            buffer.seek(0)
+
+            copy_sql = """
+            COPY ping_results (
+                ip_address, packets_sent, packets_received,
+                loss_pct, latency_dms, is_active,
+                scan_timestamp, ttl
+            ) FROM STDIN WITH CSV
+            """
+
+            self.cursor.copy_expert(copy_sql, buffer)
+
+        except Exception as e:
+            logger.error(f"Error guardando {len(scan_rows)} resultados: {e}")
+
+    async def _iter_ping_results(self, sock, host_range, max_workers):
+        """
+        Genera los resultados del ping de cada IP. Usa el socket ICMP recibido y,
+        si no hay uno (sin permisos o en Windows), recurre al comando ping del sistema
+
+        Args:
+            sock (socket.socket): Socket ICMP de _open_icmp_socket, o None
+            host_range (range): Direcciones IP (como enteros) a escanear
+            max_workers (int): Número máximo de procesos ping simultáneos
+        """
+        if sock is not None:
+            try:
+                for ping_result in await self._raw_ping_batch(sock, host_range):
+                    yield ping_result
+            finally:
+                sock.close()
+            return
+
+        logger.warning("No se pudo abrir un socket ICMP; usando el comando ping del sistema")
+        semaphore = asyncio.Semaphore(max_workers)
+        # Crear las tareas a medida que avanza el escaneo, con como máximo
+        # 2 * max_workers pendientes, en lugar de una por host desde el inicio
+        pending = set()
+        for ip_int in host_range:
+            if len(pending) >= 2 * max_workers:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+            pending.add(asyncio.create_task(self.ping_host(_int_to_ip(ip_int), semaphore)))
+
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+
+    async def _scan_hosts(self, host_range, max_workers, scan_timestamp):
+        """
+        Hace ping a todas las IPs, muestra el progreso y guarda los resultados al final
+
+        Args:
+            host_range (range): Direcciones IP (como enteros) a escanear
+            max_workers (int): Número máximo de procesos ping simultáneos
+            scan_timestamp (datetime): Marca de tiempo común a todas las filas del escaneo
+
+        Returns:
+            tuple: (hosts escaneados, hosts activos)
+        """
+        total_hosts = len(host_range)
+        scanned_hosts = 0
+        active_hosts = 0
+        scan_rows = []
+        last_progress_log = time.monotonic()
+        sock = self._open_icmp_socket()
+        # En modo socket los resultados llegan todos juntos al final:
+        # el progreso lo informa _raw_ping_batch mientras envía y recibe
+        report_progress = sock is None
+
+        # Procesar resultados conforme van llegando
+        async for ping_result in self._iter_ping_results(sock, host_range, max_workers):
+            try:
+                # Latencia en décimas de ms y pérdida en % entero (columnas SMALLINT)
+                latency = ping_result['latency_ms']
+                scan_rows.append((
                     ping_result['ip_address'],
                     ping_result['packets_sent'],
                     ping_result['packets_received'],
-                    ping_result['packet_loss_percentage'],
-                    ping_result['latency_ms'],
+                    round(ping_result['packet_loss_percentage']),
+                    None if latency is None else min(round(latency * 10), SMALLINT_MAX),
                     ping_result['is_active'],
-                    ping_result['scan_timestamp'],
-                    ping_result['response_time'],
+                    scan_timestamp,
                     ping_result['ttl']
                 ))
-                
-                cursor.close()
-                
-        except Exception as e:
-            logger.error(f"Error guardando resultado para {ping_result['ip_address']}: {e}")
-    
+
+                scanned_hosts += 1
+                if ping_result['is_active']:
+                    active_hosts += 1
+
+                # Mostrar progreso como máximo una vez por intervalo
+                now = time.monotonic()
+                if report_progress and now - last_progress_log >= PROGRESS_LOG_INTERVAL:
+                    last_progress_log = now
+                    logger.info(
+                        "Progreso: %.1f%% (%d/%d) - Activos: %d",
+                        scanned_hosts / total_hosts * 100, scanned_hosts, total_hosts, active_hosts
+                    )
+
+            except Exception as e:
+                logger.error("Error procesando %s: %s", ping_result['ip_address'], e)
+
+        logger.info(
+            "Progreso: %.1f%% (%d/%d) - Activos: %d",
+            scanned_hosts / total_hosts * 100 if total_hosts else 100.0,
+            scanned_hosts, total_hosts, active_hosts
+        )
+
+        # Guardar todos los resultados en un único COPY, en la partición del día
+        self.create_daily_partition(scan_timestamp)
+        self.save_ping_results(scan_rows)
+
+        return scanned_hosts, active_hosts
+
     def scan_network_range(self, network_cidr="192.168.137.0/24", max_workers=50):
         """
         Escanea un rango completo de red usando ping
-        
+
         Args:
             network_cidr (str): Red en formato CIDR (ej: 192.168.137.0/24)
-            max_workers (int): Número máximo de threads concurrentes
+            max_workers (int): Número máximo de procesos ping simultáneos
+                (solo en el modo comando ping)
         """
         logger.info(f"Iniciando escaneo de red: {network_cidr}")
-        
+
         try:
             network = ipaddress.IPv4Network(network_cidr, strict=False)
-            total_hosts = sum(1 for _ in network.hosts())
-            scanned_hosts = 0
-            active_hosts = 0
-            
+            first_host = int(network.network_address)
+            last_host = int(network.broadcast_address)
+            # Igual que network.hosts(): sin red ni broadcast, salvo en /31 y /32
+            if network.prefixlen < 31:
+                first_host += 1
+                last_host -= 1
+            host_range = range(first_host, last_host + 1)
+            total_hosts = len(host_range)
+
             logger.info(f"Total de hosts a escanear: {total_hosts}")
-            
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                # Enviar trabajos de ping
-                future_to_ip = {
-                    executor.submit(self.ping_host, str(ip)): str(ip) 
-                    for ip in network.hosts()
-                }
-                
-                # Procesar resultados conforme van llegando
-                for future in as_completed(future_to_ip):
-                    ip = future_to_ip[future]
-                    try:
-                        ping_result = future.result()
-                        self.save_ping_result(ping_result)
-                        
-                        scanned_hosts += 1
-                        if ping_result['is_active']:
-                            active_hosts += 1
-                        
-                        # Mostrar progreso cada 10 hosts
-                        if scanned_hosts % 10 == 0:
-                            progress = (scanned_hosts / total_hosts) * 100
-                            logger.info(f"Progreso: {progress:.1f}% ({scanned_hosts}/{total_hosts}) - Activos: {active_hosts}")
-                            
-                    except Exception as e:
-                        logger.error(f"Error procesando {ip}: {e}")
-            
+
+            # Una sola marca de tiempo para todo el escaneo
+            scan_timestamp = datetime.now()
+            scanned_hosts, active_hosts = asyncio.run(
+                self._scan_hosts(host_range, max_workers, scan_timestamp)
+            )
+
             logger.info(f"Escaneo completado: {active_hosts}/{total_hosts} hosts activos")
             return {
                 'total_hosts': total_hosts,
@@ -247,34 +666,31 @@ class NetworkDiscovery:
                 'active_hosts': active_hosts,
                 'success_rate': (scanned_hosts / total_hosts) * 100
             }
-            
+
         except Exception as e:
             logger.error(f"Error durante el escaneo de red: {e}")
             return None
-    
+
     def get_scan_summary(self):
         """Obtiene un resumen de los resultados del último escaneo"""
         try:
-            cursor = self.connection.cursor(cursor_factory=RealDictCursor)
-            
             summary_sql = """
             SELECT 
                 COUNT(*) as total_scanned,
                 COUNT(*) FILTER (WHERE is_active = true) as active_hosts,
                 COUNT(*) FILTER (WHERE is_active = false) as inactive_hosts,
-                AVG(latency_ms) FILTER (WHERE latency_ms IS NOT NULL) as avg_latency,
-                MIN(latency_ms) FILTER (WHERE latency_ms IS NOT NULL) as min_latency,
-                MAX(latency_ms) FILTER (WHERE latency_ms IS NOT NULL) as max_latency,
+                AVG(latency_dms) FILTER (WHERE latency_dms IS NOT NULL) / 10.0 as avg_latency,
+                MIN(latency_dms) FILTER (WHERE latency_dms IS NOT NULL) / 10.0 as min_latency,
+                MAX(latency_dms) FILTER (WHERE latency_dms IS NOT NULL) / 10.0 as max_latency,
                 MAX(scan_timestamp) as last_scan
             FROM ping_results 
             WHERE scan_timestamp >= CURRENT_TIMESTAMP - INTERVAL '1 hour'
             """
             
-            cursor.execute(summary_sql)
-            summary = cursor.fetchone()
-            cursor.close()
+            self.cursor.execute(summary_sql)
+            row = self.cursor.fetchone()
             
-            return dict(summary) if summary else None
+            return dict(zip(SUMMARY_COLUMNS, row)) if row else None
             
         except Exception as e:
             logger.error(f"Error obteniendo resumen: {e}")
@@ -282,6 +698,8 @@ class NetworkDiscovery:
     
     def close_connection(self):
         """Cierra la conexión a la base de datos"""
+        if self.cursor:
+            self.cursor.close()
         if self.connection:
             self.connection.close()
             logger.info("Conexión a base de datos cerrada")
@@ -307,8 +725,8 @@ def main():
             logger.error("No se pudo conectar a la base de datos. Terminando...")
             return
         
-        # Crear tabla si no existe
-        if not discovery.create_table_if_not_exists():
+        # Crear tabla si no existe (se omite si el centinela del esquema existe)
+        if not discovery.ensure_schema():
             logger.error("No se pudo crear/verificar la tabla. Terminando...")
             return
         
@@ -341,9 +759,9 @@ def main():
                 logger.info("=" * 60)
                 logger.info("ESTADÍSTICAS DETALLADAS")
                 logger.info("=" * 60)
-                logger.info(f"Latencia promedio: {summary['avg_latency']:.2f}ms" if summary['avg_latency'] else "Latencia promedio: N/A")
-                logger.info(f"Latencia mínima: {summary['min_latency']:.2f}ms" if summary['min_latency'] else "Latencia mínima: N/A")
-                logger.info(f"Latencia máxima: {summary['max_latency']:.2f}ms" if summary['max_latency'] else "Latencia máxima: N/A")
+                logger.info(f"Latencia promedio: {summary['avg_latency']:.2f}ms" if summary['avg_latency'] is not None else "Latencia promedio: N/A")
+                logger.info(f"Latencia mínima: {summary['min_latency']:.2f}ms" if summary['min_latency'] is not None else "Latencia mínima: N/A")
+                logger.info(f"Latencia máxima: {summary['max_latency']:.2f}ms" if summary['max_latency'] is not None else "Latencia máxima: N/A")
         
     except KeyboardInterrupt:
         logger.info("Escaneo interrumpido por el usuario")